@@ -1,19 +1,25 @@
 import streamlit as st
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import altair as alt
 from typing import Any, Dict
 import base64
 
-from eartrainer.audio import harmonic as synth_harmonic, melodic as synth_melodic, wav_bytes
-from eartrainer.models import AnswerRecord, Settings, Mode, Waveform, Stats
+from eartrainer.audio import harmonic_midi as synth_harmonic, melodic_midi as synth_melodic, wav_bytes
+from eartrainer.models import AnswerRecord, IntervalStats, Settings, Mode, Waveform, Stats
 from eartrainer.storage import load_settings, load_stats, save_settings, save_stats
-from eartrainer.theory import midi_pair_to_freqs
+from eartrainer.theory import interval_names
 from eartrainer.trainer import AdaptiveState, make_question, score_answer
 from eartrainer.piano import is_soundfont_available, render_instrument_bytes, render_piano_bytes
 
 
 st.set_page_config(page_title="Ear Trainer", page_icon=None, layout="centered")
 
+# Rows/columns of the dense session confusion matrix (truth x chosen)
+CONFUSION_NAMES = interval_names()
+CONFUSION_IDX = {name: i for i, name in enumerate(CONFUSION_NAMES)}
+
 
 def get_state() -> Any:
 	if "settings" not in st.session_state:
@@ -39,13 +45,24 @@ def get_state() -> Any:
 		st.session_state.trigger_autoplay = False
 	if "play_version" not in st.session_state:
 		st.session_state.play_version = 0
+	if "current_question_audio_key" not in st.session_state:
+		st.session_state.current_question_audio_key = None
+	if "current_question_audio_bytes" not in st.session_state:
+		st.session_state.current_question_audio_bytes = b""
 	if "clear_audio" not in st.session_state:
 		st.session_state.clear_audio = False
 	if "session_stats" not in st.session_state:
 		st.session_state.session_stats = Stats()
+	if "session_confusion" not in st.session_state:
+		st.session_state.session_confusion = _empty_confusion()
 	return st.session_state
 
 
+def _empty_confusion() -> npt.NDArray[np.int32]:
+	n = len(CONFUSION_NAMES)
+	return np.zeros((n, n), dtype=np.int32)
+
+
 def sidebar_controls(s: Settings) -> Settings:
 	st.sidebar.header("Settings")
 	with st.sidebar.form("settings_form"):
@@ -89,12 +106,16 @@ def sidebar_controls(s: Settings) -> Settings:
 		return s
 
 
+# Keyed only on what determines the audio: distinct note pairs x mode over every
+# slider range (789, incl. tight-range fallbacks) x 3 synth waveforms, about 2.4k
+# entries at most, so no max_entries cap (a smaller one would evict reachable keys).
+# play_version drives autoplay and must never be an argument here.
 @st.cache_data(show_spinner=False)
-def _cached_audio_bytes(f1: float, f2: float, mode: str, waveform: str, salt: int) -> bytes:
+def _cached_audio_bytes(m1: int, m2: int, mode: str, waveform: str) -> bytes:
 	if mode == "harmonic":
-		x = synth_harmonic(f1, f2, dur=1.0, waveform=waveform)
+		x = synth_harmonic(m1, m2, dur=1.0, waveform=waveform)
 	else:
-		x = synth_melodic(f1, f2, gap=0.10, dur=0.60, waveform=waveform)
+		x = synth_melodic(m1, m2, gap=0.10, dur=0.60, waveform=waveform)
 	return wav_bytes(x)
 
 
@@ -131,17 +152,22 @@ def main() -> None:
 			st.rerun()
 
 		m1, m2 = state.current_question.pair_midi
-		f1, f2 = midi_pair_to_freqs(m1, m2)
-		# Soundfont instruments bypass cache to avoid caching external renderer quirks
-		soundfont_instruments = ["piano", "acoustic_guitar", "electric_guitar_clean", "electric_guitar_jazz"]
-		if state.settings.waveform in soundfont_instruments:
-			try:
-				bytes_ = render_instrument_bytes(m1, m2, state.current_question.mode, state.settings.volume, state.settings.waveform)
-			except Exception as e:
-				st.warning(str(e))
-				bytes_ = _cached_audio_bytes(f1, f2, state.current_question.mode, "sine", state.play_version)
-		else:
-			bytes_ = _cached_audio_bytes(f1, f2, state.current_question.mode, state.settings.waveform, state.play_version)
+		# Render once per question; reruns from option clicks reuse the stored bytes
+		audio_key = (m1, m2, state.current_question.mode, state.settings.waveform, state.settings.volume)
+		if state.current_question_audio_key != audio_key:
+			# Soundfont instruments bypass cache to avoid caching external renderer quirks
+			soundfont_instruments = ["piano", "acoustic_guitar", "electric_guitar_clean", "electric_guitar_jazz"]
+			if state.settings.waveform in soundfont_instruments:
+				try:
+					bytes_ = render_instrument_bytes(m1, m2, state.current_question.mode, state.settings.volume, state.settings.waveform)
+				except Exception as e:
+					st.warning(str(e))
+					bytes_ = _cached_audio_bytes(m1, m2, state.current_question.mode, "sine")
+			else:
+				bytes_ = _cached_audio_bytes(m1, m2, state.current_question.mode, state.settings.waveform)
+			state.current_question_audio_bytes = bytes_
+			state.current_question_audio_key = audio_key
+		bytes_ = state.current_question_audio_bytes
 		if state.trigger_autoplay:
 			player.empty()
 			player.audio(bytes_, format="audio/wav", autoplay=True)
@@ -166,15 +192,14 @@ def main() -> None:
 			state.history.append(record)
 			save_stats(state.stats)
 			# Update session-scoped stats (no adaptive update here)
-			if state.current_question.interval not in state.session_stats.by_interval:
-				from eartrainer.models import IntervalStats
-				state.session_stats.by_interval[state.current_question.interval] = IntervalStats()
-			state.session_stats.by_interval[state.current_question.interval].seen += 1
+			session_i = state.session_stats.by_interval.get(state.current_question.interval)
+			if session_i is None:
+				session_i = state.session_stats.by_interval[state.current_question.interval] = IntervalStats()
+			session_i.seen += 1
 			if record.correct:
-				state.session_stats.by_interval[state.current_question.interval].correct += 1
+				session_i.correct += 1
 			else:
-				conf = state.session_stats.confusion.setdefault(state.current_question.interval, {})
-				conf[clicked] = conf.get(clicked, 0) + 1
+				state.session_confusion[CONFUSION_IDX[state.current_question.interval], CONFUSION_IDX[clicked]] += 1
 			# Set feedback indicator (green/red)
 			if record.correct:
 				state.feedback = {"correct": True, "text": "Correct!"}
@@ -202,6 +227,7 @@ def main() -> None:
 		state.trigger_autoplay = False
 		state.clear_audio = False
 		state.session_stats = Stats()
+		state.session_confusion = _empty_confusion()
 
 	# Results table (simple for MVP)
 	if state.session_stats.by_interval:
@@ -212,21 +238,29 @@ def main() -> None:
 			rows.append({"interval": name, "seen": st_i.seen, "correct": st_i.correct, "accuracy": round(acc, 3)})
 		st.dataframe(rows, hide_index=True)
 
-	if state.session_stats.confusion:
+	if state.session_confusion.any():
 		st.subheader("Confusion heatmap")
-		# Flatten confusion dict to long-form DataFrame
-		data = []
-		for truth, d in state.session_stats.confusion.items():
-			for chosen, count in d.items():
-				data.append({"truth": truth, "chosen": chosen, "count": count})
-		df = pd.DataFrame(data)
-		chart = alt.Chart(df).mark_rect().encode(
-			x=alt.X("chosen:N", sort=None),
-			y=alt.Y("truth:N", sort=None),
-			color=alt.Color("count:Q", scale=alt.Scale(scheme="oranges")),
-			tooltip=["truth","chosen","count"],
-		).properties(width=400, height=300)
-		st.altair_chart(chart, use_container_width=True)
+		st.vega_lite_chart(_confusion_chart_spec(state.session_confusion.tobytes()), use_container_width=True)
+
+
+# Every wrong answer yields a new matrix (and key), so keep only recent specs
+@st.cache_data(show_spinner=False, max_entries=32)
+def _confusion_chart_spec(counts: bytes) -> Dict[str, Any]:
+	# Keyed on the raw matrix bytes, so the chart is rebuilt only when it changes
+	n = len(CONFUSION_NAMES)
+	mat = np.frombuffer(counts, dtype=np.int32).reshape(n, n)
+	truth, chosen = np.meshgrid(CONFUSION_NAMES, CONFUSION_NAMES, indexing="ij")
+	# Long-form cells, keeping only observed confusions
+	nz = mat.ravel() > 0
+	df = pd.DataFrame({"truth": truth.ravel()[nz], "chosen": chosen.ravel()[nz], "count": mat.ravel()[nz]})
+	chart = alt.Chart(df).mark_rect().encode(
+		x=alt.X("chosen:N", sort=CONFUSION_NAMES),
+		y=alt.Y("truth:N", sort=CONFUSION_NAMES),
+		color=alt.Color("count:Q", scale=alt.Scale(scheme="oranges")),
+		tooltip=["truth","chosen","count"],
+	).properties(width=400, height=300)
+	spec: Dict[str, Any] = chart.to_dict()
+	return spec
 
 
 if __name__ == "__main__":
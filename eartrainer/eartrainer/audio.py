@@ -1,10 +1,29 @@
 SR = 44100
 
-import io
+import functools
+import struct
 from typing import Any, cast
 import numpy as np
 import numpy.typing as npt
-import soundfile as sf
+
+from .theory import midi_to_freq
+
+
+# ADSR-lite: 5ms attack, 50ms release
+_ATTACK = int(0.005 * SR)
+_RELEASE = int(0.050 * SR)
+_ATTACK_RAMP = np.linspace(0.0, 1.0, _ATTACK, endpoint=False, dtype=np.float32)
+_RELEASE_RAMP = np.linspace(1.0, 0.0, _RELEASE, endpoint=False, dtype=np.float32)
+
+# Shared float32 sample-index ramp, grown on demand by _ramp()
+_RAMP = np.arange(2 * SR, dtype=np.float32)
+
+
+def _ramp(n: int) -> npt.NDArray[np.float32]:
+	global _RAMP
+	if n > len(_RAMP):
+		_RAMP = np.arange(n, dtype=np.float32)
+	return _RAMP[:n]
 
 
 def tone(freq: float, dur: float, waveform: str = "sine") -> npt.NDArray[np.float32]:
@@ -15,46 +34,103 @@ def tone(freq: float, dur: float, waveform: str = "sine") -> npt.NDArray[np.floa
 		dur: Duration in seconds
 		waveform: One of {"sine","triangle","saw"}
 	"""
-	t = np.linspace(0.0, dur, int(SR * dur), endpoint=False, dtype=np.float32)
-	omega = 2.0 * np.pi * freq
+	x = np.empty(int(SR * dur), dtype=np.float32)
+	tone_into(x, freq, dur, waveform)
+	return x
+
+
+def tone_into(x: npt.NDArray[np.float32], freq: float, dur: float, waveform: str = "sine") -> None:
+	"""Write `tone(freq, dur, waveform)` into the preallocated buffer `x` in place."""
+	n = len(x)
 	if waveform == "sine":
-		x = np.sin(omega * t).astype(np.float32)
-	elif waveform == "triangle":
-		# 2/pi * arcsin(sin)
-		x = ((2.0 / np.pi) * np.arcsin(np.sin(omega * t))).astype(np.float32)
+		# phase in radians; np.sin is SIMD-vectorized and beats a table lookup
+		np.multiply(_ramp(n), np.float32(2.0 * np.pi * freq * dur / max(n, 1)), out=x)
+		np.sin(x, out=x)
 	else:
-		# sawtooth via fractional part formula
-		phase = (freq * t).astype(np.float32)
-		x = (2.0 * (phase - np.floor(phase + 0.5))).astype(np.float32)
+		# phase in cycles, shaped with plain arithmetic (no transcendentals)
+		np.multiply(_ramp(n), np.float32(freq * dur / max(n, 1)), out=x)
+		if waveform == "triangle":
+			# 1 - 4*|frac(phase + 1/4) - 1/2|, i.e. 2/pi * arcsin(sin)
+			x += np.float32(0.25)
+			x -= np.floor(x)
+			x -= np.float32(0.5)
+			np.abs(x, out=x)
+			x *= np.float32(-4.0)
+			x += np.float32(1.0)
+		else:
+			# sawtooth via fractional part formula
+			frac = np.add(x, np.float32(0.5))
+			np.floor(frac, out=frac)
+			x -= frac
+			x *= np.float32(2.0)
 
-	# ADSR-lite: 5ms attack, 50ms release
-	attack = int(0.005 * SR)
-	release = int(0.050 * SR)
-	env = np.ones_like(x, dtype=np.float32)
-	if attack > 0:
-		env[:attack] = np.linspace(0.0, 1.0, attack, endpoint=False, dtype=np.float32)
-	if release > 0:
-		env[-release:] = np.linspace(1.0, 0.0, release, endpoint=False, dtype=np.float32)
+	# ADSR-lite: ramp only the attack/release edges in place
+	x[:_ATTACK] *= _ATTACK_RAMP
+	x[-_RELEASE:] *= _RELEASE_RAMP
 
-	y = (x * env).astype(np.float32)
-	return cast(npt.NDArray[np.float32], y)
 
+@functools.lru_cache(maxsize=256)
+def _tone_cached(midi: int, waveform: str, dur: float) -> npt.NDArray[np.float32]:
+	"""Memoized `tone` for a MIDI note; the returned buffer is read-only."""
+	x = tone(midi_to_freq(midi), dur, waveform)
+	x.flags.writeable = False
+	return x
 
-def melodic(f1: float, f2: float, gap: float = 0.10, dur: float = 0.60, waveform: str = "sine") -> npt.NDArray[np.float32]:
-	gap_samples = int(SR * gap)
-	n_gap = np.zeros(gap_samples, dtype=np.float32)
-	return np.concatenate([tone(f1, dur, waveform), n_gap, tone(f2, dur, waveform)])
 
+def _join_melodic(x1: npt.NDArray[np.float32], x2: npt.NDArray[np.float32], gap: float) -> npt.NDArray[np.float32]:
+	n1, ng = len(x1), int(SR * gap)
+	out = np.empty(n1 + ng + len(x2), dtype=np.float32)
+	out[:n1] = x1
+	out[n1:n1 + ng] = 0.0
+	out[n1 + ng:] = x2
+	return out
 
-def harmonic(f1: float, f2: float, dur: float = 1.0, waveform: str = "sine") -> npt.NDArray[np.float32]:
-	x = tone(f1, dur, waveform) + tone(f2, dur, waveform)
+
+def _mix_harmonic(x1: npt.NDArray[np.float32], x2: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+	x = x1 + x2
 	max_abs = float(np.max(np.abs(x))) if x.size else 1.0
 	if max_abs > 0.0:
 		x = (x / max_abs).astype(np.float32)
 	return cast(npt.NDArray[np.float32], x)
 
 
+def melodic(f1: float, f2: float, gap: float = 0.10, dur: float = 0.60, waveform: str = "sine") -> npt.NDArray[np.float32]:
+	# Synthesize both tones straight into one output buffer
+	n, ng = int(SR * dur), int(SR * gap)
+	out = np.empty(2 * n + ng, dtype=np.float32)
+	tone_into(out[:n], f1, dur, waveform)
+	out[n:n + ng] = 0.0
+	tone_into(out[n + ng:], f2, dur, waveform)
+	return out
+
+
+def harmonic(f1: float, f2: float, dur: float = 1.0, waveform: str = "sine") -> npt.NDArray[np.float32]:
+	return _mix_harmonic(tone(f1, dur, waveform), tone(f2, dur, waveform))
+
+
+def melodic_midi(m1: int, m2: int, gap: float = 0.10, dur: float = 0.60, waveform: str = "sine") -> npt.NDArray[np.float32]:
+	"""Like `melodic`, but for MIDI notes, reusing cached per-note tones."""
+	return _join_melodic(_tone_cached(m1, waveform, dur), _tone_cached(m2, waveform, dur), gap)
+
+
+def harmonic_midi(m1: int, m2: int, dur: float = 1.0, waveform: str = "sine") -> npt.NDArray[np.float32]:
+	"""Like `harmonic`, but for MIDI notes, reusing cached per-note tones."""
+	return _mix_harmonic(_tone_cached(m1, waveform, dur), _tone_cached(m2, waveform, dur))
+
+
+# Canonical 44-byte RIFF header for 16-bit PCM mono at SR
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+
 def wav_bytes(x: npt.NDArray[np.float32]) -> bytes:
-	buf = io.BytesIO()
-	sf.write(buf, x, SR, format="WAV")
-	return buf.getvalue()
+	"""Encode a float buffer in [-1, 1] as a 16-bit PCM mono WAV file."""
+	pcm = np.multiply(x, np.float32(32767.0), dtype=np.float32)
+	np.rint(pcm, out=pcm)
+	np.clip(pcm, -32768.0, 32767.0, out=pcm)
+	data = pcm.astype("<i2").tobytes()
+	header = _WAV_HEADER.pack(
+		b"RIFF", 36 + len(data), b"WAVE",
+		b"fmt ", 16, 1, 1, SR, SR * 2, 2, 16,
+		b"data", len(data),
+	)
+	return header + data
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Literal, Tuple
+from typing import Counter, Dict, List, Literal, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -27,7 +27,8 @@ class IntervalStats(BaseModel):
 
 class Stats(BaseModel):
 	by_interval: Dict[str, IntervalStats] = Field(default_factory=dict)
-	confusion: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+	# truth -> chosen -> count; Counter so a new cell can be bumped with += 1
+	confusion: Dict[str, Counter[str]] = Field(default_factory=dict)
 
 
 class Question(BaseModel):
@@ -1,16 +1,26 @@
+import functools
+import importlib
 import os
 import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 import mido
 import io
 import numpy as np
+import numpy.typing as npt
 import soundfile as sf
 
+# Optional in-process renderer (pyfluidsynth); falls back to the fluidsynth CLI
+try:
+	fluidsynth: Any = importlib.import_module("fluidsynth")
+except ImportError:
+	fluidsynth = None
+
 SF2_DIR = Path.home() / ".eartrainer" / "sf2"
 SF2_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -29,14 +39,32 @@ INSTRUMENT_PROGRAMS = {
 	"electric_guitar_jazz": 26,  # Electric Guitar (jazz)
 }
 
+SAMPLE_RATE = 44100
+# Note timing in seconds, shared by the in-process renderer and the MIDI file
+NOTE_SECONDS = 0.6
+GAP_SECONDS = 0.1
+HARM_SECONDS = 1.0
+
+# One synth per soundfont path, loaded on first use and reused across renders
+_synths: Dict[str, Tuple[Any, int]] = {}
+_synth_lock = threading.Lock()
+
+# Background soundfont download started by ensure_sf2()
+_sf2_download: Optional[threading.Thread] = None
+_sf2_download_lock = threading.Lock()
+
 
+# PATH and soundfont lookups can't change on their own mid-process, so they are
+# memoized; refresh_soundfont_cache() drops them after the files change
+@functools.lru_cache(maxsize=None)
 def _which(cmd: str) -> bool:
 	return shutil.which(cmd) is not None
 
 
+@functools.lru_cache(maxsize=None)
 def is_soundfont_available() -> bool:
 	"""Check if FluidSynth and a soundfont are available for rendering instruments."""
-	if not _which("fluidsynth"):
+	if fluidsynth is None and not _which("fluidsynth"):
 		return False
 	ensure_sf2()  # Attempt to download if not present
 	p = get_sf2_path()
@@ -47,6 +75,7 @@ def is_piano_available() -> bool:
 	return is_soundfont_available()
 
 
+@functools.lru_cache(maxsize=None)
 def get_sf2_path(instrument: str = "piano") -> Path:
 	# Prefer env override
 	if ENV_SF2_PATH:
@@ -73,20 +102,59 @@ def get_sf2_path(instrument: str = "piano") -> Path:
 
 
 def ensure_sf2() -> None:
+	"""Start downloading the default soundfont in the background if it's missing.
+
+	Returns immediately; instruments become available once the download lands.
+	"""
+	global _sf2_download
 	p = get_sf2_path()
 	if p.exists():
 		return
 	# If env variable is set but file doesn't exist, don't auto-download
 	if ENV_SF2_PATH:
 		return
-	# Auto-download FluidR3Mono_GM soundfont to default location
+	with _sf2_download_lock:
+		if _sf2_download is None or not _sf2_download.is_alive():
+			_sf2_download = threading.Thread(target=_download_sf2, args=(p,), daemon=True)
+			_sf2_download.start()
+
+
+def is_sf2_downloading() -> bool:
+	return _sf2_download is not None and _sf2_download.is_alive()
+
+
+def _download_sf2(p: Path) -> None:
+	# Auto-download FluidR3Mono_GM soundfont to default location, streamed to a
+	# temp file and swapped in so a partial download is never picked up
+	tmp = p.with_name(p.name + ".part")
 	try:
-		response = requests.get(DEFAULT_SF2_URL, timeout=30)
-		response.raise_for_status()
-		p.write_bytes(response.content)
-	except Exception as e:
+		with requests.get(DEFAULT_SF2_URL, timeout=30, stream=True) as response:
+			response.raise_for_status()
+			with tmp.open("wb") as f:
+				for chunk in response.iter_content(64 * 1024):
+					f.write(chunk)
+		os.replace(tmp, p)
+	except Exception:
 		# Silent fail - user will see error message later if they try to use piano
-		pass
+		tmp.unlink(missing_ok=True)
+		return
+	refresh_soundfont_cache()
+
+
+def refresh_soundfont_cache() -> None:
+	"""Forget memoized FluidSynth/soundfont lookups, e.g. after a download."""
+	_which.cache_clear()
+	is_soundfont_available.cache_clear()
+	get_sf2_path.cache_clear()
+
+
+def _velocity(volume: float) -> int:
+	# Scale velocity by volume (60..120)
+	return max(1, min(127, int(60 + 60 * volume)))
+
+
+def _target_seconds(mode: str) -> float:
+	return 1.3 if mode == "harmonic" else 1.6
 
 
 def _write_midi(temp_mid: Path, notes: Tuple[int, int], mode: str, volume: float, program: int = 0) -> None:
@@ -98,14 +166,13 @@ def _write_midi(temp_mid: Path, notes: Tuple[int, int], mode: str, volume: float
 	# Channel 0, program number for selected instrument
 	trk.append(mido.Message('program_change', program=program, time=0))
 	m1, m2 = notes
-	# Scale velocity by volume (60..120)
-	vel = max(1, min(127, int(60 + 60 * volume)))
+	vel = _velocity(volume)
 	# Ticks per beat is 480 by default
 	TPB = mid.ticks_per_beat  # 480
 	# Durations at 100 BPM: 1 beat = 0.6s
 	NOTE_TICKS = TPB  # 0.6s
-	GAP_TICKS = int(TPB * (0.1 / 0.6))  # ~80 ticks
-	HARM_TICKS = int(TPB * (1.0 / 0.6))  # ~800 ticks
+	GAP_TICKS = int(TPB * (GAP_SECONDS / NOTE_SECONDS))  # ~80 ticks
+	HARM_TICKS = int(TPB * (HARM_SECONDS / NOTE_SECONDS))  # ~800 ticks
 	if mode == "harmonic":
 		trk.append(mido.Message('note_on', note=m1, velocity=vel, time=0))
 		trk.append(mido.Message('note_on', note=m2, velocity=vel, time=0))
@@ -128,23 +195,83 @@ def _trim_to_duration(wav_bytes: bytes, seconds: float, sr_target: int = 44100)
 	# Resample if needed would be overkill; fluidsynth default is 44100, we force -r 44100
 	target_samples = int(sr_target * seconds)
 	data = data[:target_samples]
+	return _encode_wav(data, sr_target)
+
+
+def _encode_wav(data: npt.NDArray[np.float32], sr: int) -> bytes:
 	buf = io.BytesIO()
-	sf.write(buf, data, sr_target, format='WAV')
+	sf.write(buf, data, sr, format='WAV')
 	return buf.getvalue()
 
 
+def _get_synth(sf2: Path) -> Tuple[Any, int]:
+	"""Return a (synth, sfid) pair for the soundfont, loading it on first use."""
+	key = sf2.as_posix()
+	if key not in _synths:
+		fs = fluidsynth.Synth(
+			gain=1.2,  # match the CLI renderer's gain
+			samplerate=float(SAMPLE_RATE),
+			**{"synth.reverb.active": 0, "synth.chorus.active": 0},
+		)
+		sfid = fs.sfload(key)
+		if sfid < 0:
+			raise RuntimeError(f"fluidsynth could not load soundfont: {key}")
+		_synths[key] = (fs, sfid)
+	return _synths[key]
+
+
+def _render(sf2: Path, m1: int, m2: int, mode: str, volume: float, program: int) -> npt.NDArray[np.float32]:
+	"""Render a note pair in-process with pyfluidsynth into a mono float32 buffer."""
+	vel = _velocity(volume)
+	chunks: List[npt.NDArray[np.int16]] = []
+	with _synth_lock:
+		fs, sfid = _get_synth(sf2)
+		fs.all_sounds_off(0)  # cut any tail left over from the previous render
+		fs.program_select(0, sfid, 0, program)
+
+		def pull(seconds: float) -> None:
+			chunks.append(fs.get_samples(int(SAMPLE_RATE * seconds)))
+
+		if mode == "harmonic":
+			fs.noteon(0, m1, vel)
+			fs.noteon(0, m2, vel)
+			pull(HARM_SECONDS)
+			fs.noteoff(0, m1)
+			fs.noteoff(0, m2)
+			pull(_target_seconds(mode) - HARM_SECONDS)
+		else:
+			fs.noteon(0, m1, vel)
+			pull(NOTE_SECONDS)
+			fs.noteoff(0, m1)
+			pull(GAP_SECONDS)
+			fs.noteon(0, m2, vel)
+			pull(NOTE_SECONDS)
+			fs.noteoff(0, m2)
+			pull(_target_seconds(mode) - 2 * NOTE_SECONDS - GAP_SECONDS)
+	# get_samples yields interleaved stereo int16; mix down to mono float32
+	stereo = np.concatenate(chunks).reshape(-1, 2)
+	mono: npt.NDArray[np.float32] = stereo.mean(axis=1, dtype=np.float32) / np.float32(32768.0)
+	return mono[: int(SAMPLE_RATE * _target_seconds(mode))]
+
+
 def render_instrument_bytes(m1: int, m2: int, mode: str, volume: float, instrument: str = "piano") -> bytes:
 	"""Render notes using FluidSynth with the specified instrument from the soundfont."""
 	ensure_sf2()
 	sf2 = get_sf2_path(instrument)  # Pass instrument to get correct soundfont
 	if not sf2.exists():
+		if is_sf2_downloading():
+			raise RuntimeError("Soundfont is still downloading; using the built-in synth for now.")
 		raise RuntimeError("SF2 not available. Set EARTRAINER_SF2_PATH to a valid .sf2 or place one in ~/.eartrainer/sf2/UprightPianoKW-small.sf2")
-	if not _which("fluidsynth"):
-		raise RuntimeError("fluidsynth not found. Install with: brew install fluidsynth")
 	
 	# Get the MIDI program number for the instrument
 	program = INSTRUMENT_PROGRAMS.get(instrument, 0)
 	
+	# Prefer the in-process synth: no process spawn, soundfont parsed once
+	if fluidsynth is not None:
+		return _encode_wav(_render(sf2, m1, m2, mode, volume, program), SAMPLE_RATE)
+	if not _which("fluidsynth"):
+		raise RuntimeError("fluidsynth not found. Install with: brew install fluidsynth")
+	
 	with tempfile.TemporaryDirectory() as td:
 		dirp = Path(td)
 		midp = dirp / "tmp.mid"
@@ -155,7 +282,7 @@ def render_instrument_bytes(m1: int, m2: int, mode: str, volume: float, instrume
 			"-g", "1.2",          # increase synth gain a bit
 			"-R", "0",             # disable reverb to remove tail
 			"-C", "0",             # disable chorus
-			"-r", "44100",         # ensure 44.1k sample rate
+			"-r", str(SAMPLE_RATE),  # ensure 44.1k sample rate
 			"-F", wavp.as_posix(),
 			sf2.as_posix(),
 			midp.as_posix(),
@@ -164,8 +291,7 @@ def render_instrument_bytes(m1: int, m2: int, mode: str, volume: float, instrume
 		if proc.returncode != 0 or not wavp.exists():
 			raise RuntimeError(f"fluidsynth failed: {proc.stderr.decode(errors='ignore')}")
 		raw = wavp.read_bytes()
-		target_seconds = 1.3 if mode == "harmonic" else 1.6
-		return _trim_to_duration(raw, target_seconds, 44100)
+		return _trim_to_duration(raw, _target_seconds(mode), SAMPLE_RATE)
 
 
 def render_piano_bytes(m1: int, m2: int, mode: str, volume: float) -> bytes:
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import copy
 import json
+import os
+import tempfile
+import threading
 from pathlib import Path
 from typing import Any, Dict
 
 from .models import Settings, Stats
 
+# Serialized defaults, built once instead of on every save
+_DEFAULT_SETTINGS_DICT: Dict[str, Any] = Settings().model_dump()
+_DEFAULT_STATS_DICT: Dict[str, Any] = Stats().model_dump()
+
 
 def _data_path() -> Path:
 	home = Path.home()
@@ -14,8 +22,15 @@ def _data_path() -> Path:
 	return dir_ / "data.json"
 
 
-def _load_raw() -> Dict[str, Any]:
-	p = _data_path()
+# Parsed data file per path; the file is only read once per process and
+# every save mutates this dict in memory before persisting it
+_raw_cache: Dict[Path, Dict[str, Any]] = {}
+# Streamlit runs sessions on separate threads; guards the cache and the file.
+# Reentrant because the save_* helpers hold it across _load_raw/_save_raw.
+_data_lock = threading.RLock()
+
+
+def _read_raw(p: Path) -> Dict[str, Any]:
 	if not p.exists():
 		return {}
 	try:
@@ -25,9 +40,33 @@ def _load_raw() -> Dict[str, Any]:
 		return {}
 
 
+def _load_raw() -> Dict[str, Any]:
+	p = _data_path()
+	with _data_lock:
+		if p not in _raw_cache:
+			_raw_cache[p] = _read_raw(p)
+		return _raw_cache[p]
+
+
 def _save_raw(data: Dict[str, Any]) -> None:
 	p = _data_path()
-	p.write_text(json.dumps(data, indent=2))
+	with _data_lock:
+		_raw_cache[p] = data
+		# Write compactly to a unique sibling temp file, flush it to disk,
+		# then atomically swap it in
+		fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=p.name + ".", suffix=".tmp")
+		try:
+			with os.fdopen(fd, "w") as f:
+				json.dump(data, f, separators=(",", ":"))
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp, p)
+		except BaseException:
+			try:
+				os.unlink(tmp)
+			except OSError:
+				pass
+			raise
 
 
 def load_settings() -> Settings:
@@ -39,10 +78,11 @@ def load_settings() -> Settings:
 
 
 def save_settings(s: Settings) -> None:
-	raw = _load_raw()
-	raw["settings"] = s.model_dump()
-	_add_defaults_if_missing(raw)
-	_save_raw(raw)
+	with _data_lock:
+		raw = _load_raw()
+		raw["settings"] = s.model_dump()
+		_add_defaults_if_missing(raw)
+		_save_raw(raw)
 
 
 def load_stats() -> Stats:
@@ -54,14 +94,15 @@ def load_stats() -> Stats:
 
 
 def save_stats(st: Stats) -> None:
-	raw = _load_raw()
-	raw["stats"] = st.model_dump()
-	_add_defaults_if_missing(raw)
-	_save_raw(raw)
+	with _data_lock:
+		raw = _load_raw()
+		raw["stats"] = st.model_dump()
+		_add_defaults_if_missing(raw)
+		_save_raw(raw)
 
 
 def _add_defaults_if_missing(raw: Dict[str, Any]) -> None:
 	if "settings" not in raw or not isinstance(raw["settings"], dict):
-		raw["settings"] = Settings().model_dump()
+		raw["settings"] = copy.deepcopy(_DEFAULT_SETTINGS_DICT)
 	if "stats" not in raw or not isinstance(raw["stats"], dict):
-		raw["stats"] = Stats().model_dump()
+		raw["stats"] = copy.deepcopy(_DEFAULT_STATS_DICT)
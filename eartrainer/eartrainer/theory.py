@@ -1,5 +1,8 @@
 from typing import List, Tuple
 
+import numpy as np
+import numpy.typing as npt
+
 SEMITONES = {
 	"m2": 1,
 	"M2": 2,
@@ -35,10 +38,29 @@ NOTE_TO_MIDI = {
 }
 
 
+# Equal-tempered frequency for every MIDI note number 0..127
+_MIDI_FREQ: npt.NDArray[np.float64] = A4_FREQ * 2.0 ** ((np.arange(128) - A4_MIDI) / 12.0)
+
+
 def midi_to_freq(m: int) -> float:
+	# Table lookup for in-range note numbers; anything else (negative,
+	# above 127, fractional) falls back to the formula
+	if isinstance(m, (int, np.integer)) and 0 <= m < 128:
+		return float(_MIDI_FREQ[m])
 	return float(A4_FREQ * (2.0 ** ((m - A4_MIDI) / 12.0)))
 
 
+def midi_to_freq_arr(arr: npt.ArrayLike) -> npt.NDArray[np.float64]:
+	"""Vectorized `midi_to_freq` for an array of MIDI note numbers."""
+	a = np.asarray(arr)
+	freqs: npt.NDArray[np.float64]
+	if a.dtype.kind in "iu" and (a.size == 0 or (a.min() >= 0 and a.max() < 128)):
+		freqs = _MIDI_FREQ[a]
+	else:
+		freqs = A4_FREQ * 2.0 ** ((a.astype(np.float64) - A4_MIDI) / 12.0)
+	return freqs
+
+
 def pick_root(mmin: int = 48, mmax: int = 69) -> int:
 	import random
 	return random.randint(mmin, mmax)
@@ -68,9 +90,8 @@ def settings_range_to_midi(range_notes: Tuple[str, str]) -> Tuple[int, int]:
 	return note_to_midi(lo), note_to_midi(hi)
 
 
-def pick_root_in_bounds(min_midi: int, max_midi: int, interval_name: str, mode: str) -> int:
-	"""Pick a root so that the second note stays within [min_midi, max_midi]."""
-	import random
+def _root_bounds(min_midi: int, max_midi: int, interval_name: str, mode: str) -> Tuple[int, int]:
+	"""Inclusive root range keeping the second note within [min_midi, max_midi]."""
 	d = SEMITONES[interval_name]
 	if mode == "descending":
 		low = min_midi + d
@@ -81,6 +102,27 @@ def pick_root_in_bounds(min_midi: int, max_midi: int, interval_name: str, mode:
 	low = max(low, min_midi)
 	high = min(high, max_midi)
 	if low > high:
-		# Fallback to simple picker if range too tight
-		return pick_root(min_midi, max_midi)
+		# Fallback to the whole range if too tight
+		return min_midi, max_midi
+	return low, high
+
+
+def pick_root_in_bounds(min_midi: int, max_midi: int, interval_name: str, mode: str) -> int:
+	"""Pick a root so that the second note stays within [min_midi, max_midi]."""
+	import random
+	low, high = _root_bounds(min_midi, max_midi, interval_name, mode)
 	return random.randint(low, high)
+
+
+def pick_root_in_bounds_excluding(min_midi: int, max_midi: int, interval_name: str, mode: str, exclude_root: int) -> int:
+	"""Like `pick_root_in_bounds`, but never returns `exclude_root` unless it is
+	the only root that fits, in a single draw."""
+	import random
+	low, high = _root_bounds(min_midi, max_midi, interval_name, mode)
+	if not (low <= exclude_root <= high):
+		return random.randint(low, high)
+	if low == high:
+		return exclude_root
+	# Draw from the range minus one slot, then skip over the excluded root
+	root = random.randint(low, high - 1)
+	return root + 1 if root >= exclude_root else root
@@ -2,131 +2,257 @@ from __future__ import annotations
 
 import math
 import random
-from collections import deque
-from typing import Deque, Dict, List, Tuple, Optional
+from collections import Counter, deque
+from typing import Deque, Dict, List, Tuple, Optional, cast
 
 import numpy as np
+import numpy.typing as npt
 
-from .models import AnswerRecord, Question, Settings, Stats
-from .theory import SEMITONES, interval_names, interval_to_pair, midi_pair_to_freqs, pick_root, pick_root_in_bounds, settings_range_to_midi
+from .models import AnswerRecord, IntervalStats, Question, Settings, Stats
+from .theory import SEMITONES, interval_names, interval_to_pair, midi_pair_to_freqs, pick_root, pick_root_in_bounds, pick_root_in_bounds_excluding, settings_range_to_midi
+
+# Questions drawn per refill of AdaptiveState's interval queue
+BATCH_SIZE = 8
+
+INTERVAL_NAMES: List[str] = interval_names()
+NAME_TO_IDX: Dict[str, int] = {n: i for i, n in enumerate(INTERVAL_NAMES)}
+SEMITONES_ARR: npt.NDArray[np.int8] = np.array([SEMITONES[n] for n in INTERVAL_NAMES], dtype=np.int8)
 
 
 class AdaptiveState:
+	"""Per-interval rolling accuracy driving the adaptive question weights.
+
+	Every interval in `theory.SEMITONES` is tracked from construction, so the
+	pool can change freely between questions; any other name is a programming
+	error and raises KeyError.
+	"""
+
 	def __init__(self, intervals: List[str], window: int = 50) -> None:
+		unknown = [name for name in intervals if name not in NAME_TO_IDX]
+		if unknown:
+			raise ValueError(f"Unknown intervals: {unknown}")
 		self.window = window
-		self.history: Dict[str, Deque[bool]] = {name: deque(maxlen=window) for name in intervals}
-		self.recent_misses: Deque[str] = deque(maxlen=3)
+		# Position of each name in the construction-time pool, for index_of()
+		self._idx_of: Dict[str, int] = {n: i for i, n in enumerate(intervals)}
+		# All per-interval state is indexed by the interval's slot in
+		# INTERVAL_NAMES; names are only mapped to slots at the API boundary
+		self.name_to_idx: Dict[str, int] = NAME_TO_IDX
+		n = len(INTERVAL_NAMES)
+		# uint8 ring buffer of the last `window` results per slot (1 byte each),
+		# write position, fill level and running correct count, so accuracy()
+		# never rescans the window
+		self._buf = np.zeros((n, window), dtype=np.uint8)
+		self._idx: List[int] = [0] * n
+		self._filled: List[int] = [0] * n
+		self._correct: List[int] = [0] * n
+		# Accuracy and recent-miss flag per slot, so weights() is pure NumPy
+		self._acc = np.zeros(n, dtype=np.float32)
+		self._recent_mask = np.zeros(n, dtype=np.float32)
+		self._recent: Deque[int] = deque(maxlen=3)
+		# Pre-drawn upcoming intervals and the pool they were drawn from
+		self._queue: Deque[str] = deque()
+		self._queue_pool: Tuple[str, ...] = ()
+
+	def index_of(self, name: str) -> int:
+		"""Position of `name` in the pool this state was built with, i.e. its
+		index in `weights(intervals)` for that same pool."""
+		return self._idx_of[name]
 
 	def seed_from_stats(self, stats: Stats) -> None:
-		for name, st_i in stats.by_interval.items():
-			if name not in self.history:
-				self.history[name] = deque(maxlen=self.window)
-			# Approximate last-window accuracy by filling deque proportionally
-			n = min(self.window, max(1, st_i.seen))
-			k = int(round((st_i.correct / st_i.seen) * n)) if st_i.seen else 0
-			self.history[name].clear()
-			self.history[name].extend([True] * k + [False] * (n - k))
+		items = stats.by_interval
+		if not items:
+			return
+		count = len(items)
+		slots = np.fromiter((self.name_to_idx[name] for name in items), dtype=np.intp, count=count)
+		seen = np.fromiter((st_i.seen for st_i in items.values()), dtype=np.int64, count=count)
+		correct = np.fromiter((st_i.correct for st_i in items.values()), dtype=np.int64, count=count)
+		# Approximate last-window accuracy by filling each window proportionally
+		n = np.minimum(self.window, np.maximum(1, seen))
+		k = np.where(seen > 0, np.round(correct / np.maximum(1, seen) * n), 0).astype(np.int64)
+		# Row r gets k[r] ones followed by zeros, all rows in one broadcast
+		self._buf[slots] = np.arange(self.window) < k[:, None]
+		self._acc[slots] = k / n
+		for slot, n_i, k_i in zip(slots.tolist(), n.tolist(), k.tolist()):
+			self._idx[slot] = n_i % self.window
+			self._filled[slot] = n_i
+			self._correct[slot] = k_i
+		self._queue.clear()
 
 	def accuracy(self, name: str) -> float:
-		h = self.history.get(name)
-		if not h or len(h) == 0:
+		slot = self.name_to_idx[name]
+		if self._filled[slot] == 0:
 			return 0.0
-		return sum(1 for x in h if x) / float(len(h))
+		return self._correct[slot] / float(self._filled[slot])
 
 	def update(self, interval: str, correct: bool) -> None:
-		self.history.setdefault(interval, deque(maxlen=self.window)).append(bool(correct))
+		slot = self.name_to_idx[interval]
+		buf = self._buf[slot]
+		i = self._idx[slot]
+		# Slot i holds the evicted result once the window is full (0 before)
+		self._correct[slot] += int(correct) - int(buf[i])
+		buf[i] = correct
+		self._idx[slot] = (i + 1) % self.window
+		self._filled[slot] = filled = min(self.window, self._filled[slot] + 1)
+		self._acc[slot] = self._correct[slot] / filled
 		if not correct:
-			self.recent_misses.append(interval)
-
-	def weights(self, intervals: List[str], min_floor: float = 0.05) -> List[float]:
-		# Base score: 1 - accuracy
-		scores = []
-		for name in intervals:
-			base = 1.0 - self.accuracy(name)
-			# Recent-mistake boost
-			if name in self.recent_misses:
-				base += 0.15
-			scores.append(max(0.0, base))
-		# Softmax
-		exps = np.exp(scores - np.max(scores) if scores else 0.0)
-		w = (exps / np.sum(exps)).tolist() if np.sum(exps) > 0 else [1.0 / max(1, len(intervals))] * len(intervals)
-		# Apply min floor
-		if len(w) > 0:
-			w = np.maximum(w, min_floor)
-			w = (w / np.sum(w)).tolist()
-		return [float(x) for x in w]
-
-
-def choose_interval(intervals: List[str], weights: List[float]) -> str:
-	idx = int(np.random.choice(len(intervals), p=weights))
-	return intervals[idx]
+			misses = self._recent
+			# Capture what the bounded deque is about to drop, then sync the mask
+			evicted = misses[0] if len(misses) == misses.maxlen else None
+			misses.append(slot)
+			self._recent_mask[slot] = 1.0
+			if evicted is not None and evicted not in misses:
+				self._recent_mask[evicted] = 0.0
+			# A miss shifts the weights (and the recent-miss boost should bring
+			# this interval back soon), so discard intervals drawn before it
+			self._queue.clear()
+
+	def weights(self, intervals: List[str], min_floor: float = 0.05) -> npt.NDArray[np.float32]:
+		if not intervals:
+			return np.zeros(0, dtype=np.float32)
+		sel = [self.name_to_idx[name] for name in intervals]
+		# Base score: 1 - accuracy, plus the recent-mistake boost
+		scores = 1.0 - self._acc[sel]
+		scores += np.float32(0.15) * self._recent_mask[sel]
+		np.maximum(scores, 0.0, out=scores)
+		hi = scores.max()
+		if hi - scores.min() < 1e-12:
+			# All tied (e.g. cold start): softmax and floor both give uniform
+			scores.fill(1.0 / len(intervals))
+			return scores
+		# Softmax with min floor, in place: flooring exp(s) at min_floor * sum
+		# equals flooring the normalized softmax, so only one division is needed
+		scores -= hi
+		np.exp(scores, out=scores)
+		np.maximum(scores, min_floor * scores.sum(), out=scores)
+		scores /= scores.sum()
+		return scores
+
+	def cdf(self, intervals: List[str], min_floor: float = 0.05) -> List[float]:
+		"""Cumulative `weights` as a plain list, ready for `choose_interval`."""
+		return cast(List[float], np.cumsum(self.weights(intervals, min_floor)).tolist())
+
+	def next_interval(self, intervals: List[str]) -> str:
+		"""Pop the next interval, drawing a fresh batch when the queue runs out.
+
+		Correct answers nudge the weights only slightly, so a batch is kept
+		across them; it is redrawn when empty, when the pool changes, or after
+		any miss (see `update`).
+		"""
+		pool = tuple(intervals)
+		if not self._queue or pool != self._queue_pool:
+			self._queue.clear()
+			self._queue.extend(prebatch_intervals(intervals, self.cdf(intervals), BATCH_SIZE))
+			self._queue_pool = pool
+		return self._queue.popleft()
+
+
+def choose_interval(intervals: List[str], cdf: List[float]) -> str:
+	# random.choices bisects the precomputed cumulative weights in C; for a
+	# dozen intervals that beats NumPy's per-call array overhead
+	return random.choices(intervals, cum_weights=cdf, k=1)[0]
+
+
+def prebatch_intervals(intervals: List[str], cdf: List[float], n: int) -> List[str]:
+	"""Draw `n` intervals in one call from the cumulative weights."""
+	return random.choices(intervals, cum_weights=cdf, k=n)
+
+
+# Every other interval, nearest first by semitone distance, per interval:
+# one stable argsort over the pairwise distance matrix, done at import
+_order = np.argsort(np.abs(SEMITONES_ARR[:, None] - SEMITONES_ARR[None, :]), axis=1, kind="stable")
+_NEAREST: Dict[str, List[str]] = {
+	c: [INTERVAL_NAMES[j] for j in _order[i] if j != i]
+	for i, c in enumerate(INTERVAL_NAMES)
+}
+del _order
 
 
 def distractors(correct: str, pool: List[str], k: int = 3) -> List[str]:
-	# Restrict distractors to the selected pool
-	names = [n for n in pool if n != correct]
+	# Restrict distractors to the selected pool, keeping nearest-first order
+	in_pool = set(pool)
+	names = [n for n in _NEAREST[correct] if n in in_pool]
 	if not names:
 		return []
-	target = SEMITONES[correct]
-	names.sort(key=lambda n: abs(SEMITONES[n] - target))
 	candidates = names[: max(1, min(k + 2, len(names)))]
 	# Occasionally insert a far distractor for variety, from within pool
 	if len(names) > 0 and random.random() < 0.2:
 		far = names[-1]
 		if far not in candidates:
 			candidates[-1] = far
-	return random.sample(candidates, k=min(k, len(candidates)))
+	k = min(k, len(candidates))
+	_partial_shuffle(candidates, k)
+	return candidates[:k]
+
+
+def _partial_shuffle(items: List[str], k: int) -> None:
+	"""Fisher-Yates over the first `k` slots of `items`, in place.
+
+	items[:k] ends up a uniform random sample in random order; k=len(items) is a
+	full shuffle. Cheaper than random.sample/random.shuffle for these tiny lists.
+	"""
+	rnd = random.random
+	n = len(items)
+	for i in range(min(k, n - 1)):
+		j = i + int(rnd() * (n - i))
+		items[i], items[j] = items[j], items[i]
 
 
 def make_question(settings: Settings, state: AdaptiveState, last_q: Optional[Question] = None) -> Question:
 	intervals = settings.intervals
-	w = state.weights(intervals)
+	mode = settings.mode
 	min_midi, max_midi = settings_range_to_midi(settings.range)
-	name = choose_interval(intervals, w)
-	root = pick_root_in_bounds(min_midi, max_midi, name, settings.mode)
-	# Avoid repeating exact same (interval, root, mode) as last
-	for _ in range(25):
-		if last_q is None or not (name == last_q.interval and root == last_q.root_midi and settings.mode == last_q.mode):
-			break
-		# Resample either root or interval
-		if random.random() < 0.7:
-			root = pick_root_in_bounds(min_midi, max_midi, name, settings.mode)
-		else:
-			name = choose_interval(intervals, w)
-	# As a last resort, nudge root within bounds if still identical
-	if last_q is not None and name == last_q.interval and root == last_q.root_midi and settings.mode == last_q.mode:
-		alt = root + 1
-		if alt <= max_midi:
-			root = alt
-		else:
-			alt2 = root - 1
-			if alt2 >= min_midi:
-				root = alt2
-	m1, m2 = interval_to_pair(root, name, settings.mode)
+	name = state.next_interval(intervals)
+	# Avoid repeating exact same (interval, root, mode) as last, by construction
+	if last_q is None or last_q.mode != mode or name != last_q.interval:
+		root = pick_root_in_bounds(min_midi, max_midi, name, mode)
+	else:
+		last_root = last_q.root_midi
+		root = pick_root_in_bounds_excluding(min_midi, max_midi, name, mode, last_root)
+		if root == last_root:
+			# Only one root fits this interval: redraw the interval with its weight zeroed
+			others = np.array([n != name for n in intervals])
+			if others.any():
+				# Floored weights are positive, so the rest of the pool has mass
+				w = state.weights(intervals)
+				w[~others] = 0.0
+				name = choose_interval(intervals, np.cumsum(w).tolist())
+				root = pick_root_in_bounds(min_midi, max_midi, name, mode)
+			else:
+				# As a last resort, nudge root within bounds
+				alt = root + 1
+				if alt <= max_midi:
+					root = alt
+				else:
+					alt2 = root - 1
+					if alt2 >= min_midi:
+						root = alt2
+	m1, m2 = interval_to_pair(root, name, mode)
 	opts = [name] + distractors(name, intervals, k=3)
-	random.shuffle(opts)
+	_partial_shuffle(opts, len(opts))
 	return Question(
 		interval=name,
 		options=opts,
 		answer=name,
 		root_midi=root,
 		pair_midi=(m1, m2),
-		mode=settings.mode,
+		mode=mode,
 	)
 
 
 def score_answer(q: Question, chosen: str, stats: Stats, state: AdaptiveState) -> AnswerRecord:
 	is_correct = chosen == q.answer
 	# Update stats
-	if q.interval not in stats.by_interval:
-		from .models import IntervalStats
-		stats.by_interval[q.interval] = IntervalStats()
-	stats.by_interval[q.interval].seen += 1
+	st_i = stats.by_interval.get(q.interval)
+	if st_i is None:
+		st_i = stats.by_interval[q.interval] = IntervalStats()
+	st_i.seen += 1
 	if is_correct:
-		stats.by_interval[q.interval].correct += 1
+		st_i.correct += 1
 	else:
-		conf = stats.confusion.setdefault(q.interval, {})
-		conf[chosen] = conf.get(chosen, 0) + 1
+		conf = stats.confusion.get(q.interval)
+		if conf is None:
+			conf = stats.confusion[q.interval] = Counter()
+		conf[chosen] += 1
 	# Update adaptive state
 	state.update(q.interval, is_correct)
 	return AnswerRecord(interval=q.interval, chosen=chosen, correct=is_correct)
@@ -1,6 +1,7 @@
 import numpy as np
 
-from eartrainer.audio import SR, harmonic, melodic, tone
+from eartrainer.audio import SR, harmonic, harmonic_midi, melodic, melodic_midi, tone, wav_bytes
+from eartrainer.theory import midi_to_freq
 
 
 def test_tone_length_and_dtype():
@@ -22,3 +23,28 @@ def test_melodic_gap_and_concat():
 def test_harmonic_normalization():
 	x = harmonic(440.0, 660.0, dur=1.0, waveform="sine")
 	assert np.max(np.abs(x)) <= 1.0 + 1e-6
+
+
+def test_tone_waveforms_bounded_float32():
+	for wf in ("sine", "triangle", "saw"):
+		x = tone(330.0, 0.25, waveform=wf)
+		assert x.dtype == np.float32
+		assert np.max(np.abs(x)) <= 1.0 + 1e-6
+
+
+def test_midi_variants_match_hz_synthesis():
+	f1, f2 = midi_to_freq(60), midi_to_freq(67)
+	assert np.array_equal(melodic_midi(60, 67, waveform="triangle"), melodic(f1, f2, waveform="triangle"))
+	assert np.array_equal(harmonic_midi(60, 67, waveform="saw"), harmonic(f1, f2, waveform="saw"))
+	# Cached tones must be reusable across calls
+	assert np.array_equal(melodic_midi(60, 67, waveform="triangle"), melodic(f1, f2, waveform="triangle"))
+
+
+def test_wav_bytes_roundtrip():
+	import io
+	import soundfile as sf
+	x = tone(440.0, 0.1, waveform="sine")
+	data, sr = sf.read(io.BytesIO(wav_bytes(x)), dtype="float32")
+	assert sr == SR
+	assert len(data) == len(x)
+	assert np.max(np.abs(data - x)) < 1e-4
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from eartrainer import piano
+
+
+class _FakeSynth:
+	"""Stands in for fluidsynth.Synth, logging note events by sample position."""
+
+	def __init__(self, **kwargs: Any) -> None:
+		self.pos = 0
+		self.events: List[Tuple[str, int, int]] = []
+
+	def sfload(self, path: str) -> int:
+		return 1
+
+	def all_sounds_off(self, chan: int) -> None:
+		pass
+
+	def program_select(self, chan: int, sfid: int, bank: int, program: int) -> None:
+		pass
+
+	def noteon(self, chan: int, key: int, vel: int) -> None:
+		self.events.append(("on", key, self.pos))
+
+	def noteoff(self, chan: int, key: int) -> None:
+		self.events.append(("off", key, self.pos))
+
+	def get_samples(self, n: int) -> np.ndarray:
+		self.pos += n
+		# Interleaved stereo: left and right differ so the mixdown is visible
+		out = np.empty(2 * n, dtype=np.int16)
+		out[0::2] = 16384
+		out[1::2] = 0
+		return out
+
+
+def _render_with_fake(monkeypatch: Any, mode: str) -> Tuple[np.ndarray, _FakeSynth]:
+	synths: List[_FakeSynth] = []
+
+	class _Module:
+		@staticmethod
+		def Synth(**kwargs: Any) -> _FakeSynth:
+			synths.append(_FakeSynth(**kwargs))
+			return synths[-1]
+
+	monkeypatch.setattr(piano, "fluidsynth", _Module)
+	monkeypatch.setattr(piano, "_synths", {})
+	x = piano._render(Path("fake.sf2"), 60, 67, mode, 0.8, 0)
+	return x, synths[0]
+
+
+def test_render_melodic_length_mono_and_timing(monkeypatch):
+	x, fs = _render_with_fake(monkeypatch, "melodic")
+	sr = piano.SAMPLE_RATE
+	assert x.dtype == np.float32
+	assert x.ndim == 1
+	assert len(x) == int(sr * piano._target_seconds("melodic"))
+	# (16384 + 0) / 2 / 32768
+	assert np.allclose(x, 0.25)
+	note = int(sr * piano.NOTE_SECONDS)
+	gap = int(sr * piano.GAP_SECONDS)
+	assert fs.events == [
+		("on", 60, 0),
+		("off", 60, note),
+		("on", 67, note + gap),
+		("off", 67, 2 * note + gap),
+	]
+
+
+def test_render_harmonic_starts_both_notes_together(monkeypatch):
+	x, fs = _render_with_fake(monkeypatch, "harmonic")
+	sr = piano.SAMPLE_RATE
+	assert len(x) == int(sr * piano._target_seconds("harmonic"))
+	held = int(sr * piano.HARM_SECONDS)
+	assert fs.events == [("on", 60, 0), ("on", 67, 0), ("off", 60, held), ("off", 67, held)]
@@ -1,10 +1,24 @@
-from eartrainer.theory import SEMITONES, A4_MIDI, A4_FREQ, midi_to_freq, interval_to_pair, note_to_midi, settings_range_to_midi
+from eartrainer.theory import SEMITONES, A4_MIDI, A4_FREQ, midi_to_freq, midi_to_freq_arr, interval_to_pair, note_to_midi, settings_range_to_midi
 
 
 def test_midi_to_freq_a4():
 	assert midi_to_freq(A4_MIDI) == A4_FREQ
 
 
+def test_midi_to_freq_table_matches_formula():
+	for m in (0, 48, 60, 81, 127):
+		assert abs(midi_to_freq(m) - A4_FREQ * 2.0 ** ((m - A4_MIDI) / 12.0)) < 1e-9
+	assert list(midi_to_freq_arr([57, 69, 81])) == [220.0, 440.0, 880.0]
+
+
+def test_midi_to_freq_outside_table_uses_formula():
+	for m in (-1, 128, 60.5):
+		expected = A4_FREQ * 2.0 ** ((m - A4_MIDI) / 12.0)
+		assert abs(midi_to_freq(m) - expected) < 1e-9
+		assert abs(midi_to_freq_arr([m])[0] - expected) < 1e-9
+	assert midi_to_freq(-1) < midi_to_freq(0)
+
+
 def test_interval_to_pair_ascending_descending():
 	root = 60
 	m1, m2 = interval_to_pair(root, "M3", "ascending")
@@ -1,5 +1,5 @@
 from eartrainer.models import Settings, Stats
-from eartrainer.trainer import AdaptiveState, make_question
+from eartrainer.trainer import AdaptiveState, choose_interval, distractors, make_question
 
 
 def test_make_question_structure():
@@ -22,6 +22,156 @@ def test_adaptive_weights_boosts_weak_intervals():
 	state.seed_from_stats(stats)
 	w = state.weights(settings.intervals)
 	# Weight for m2 should be higher than for P5
-	w_m2 = w[settings.intervals.index("m2")]
-	w_p5 = w[settings.intervals.index("P5")]
+	w_m2 = w[state.index_of("m2")]
+	w_p5 = w[state.index_of("P5")]
 	assert w_m2 > w_p5
+
+
+def test_adaptive_accuracy_tracks_sliding_window():
+	state = AdaptiveState(["M3"], window=4)
+	assert state.accuracy("M3") == 0.0
+	for correct in (True, True, False):
+		state.update("M3", correct)
+	assert state.accuracy("M3") == 2 / 3
+	# Three more misses fill the window and evict both correct results
+	for _ in range(3):
+		state.update("M3", False)
+	assert state.accuracy("M3") == 0.0
+	state.update("M3", True)
+	assert state.accuracy("M3") == 0.25
+
+
+def test_distractors_stay_in_pool_and_exclude_answer():
+	pool = ["m2", "M3", "P5", "M6", "P8"]
+	for _ in range(50):
+		ds = distractors("P5", pool, k=3)
+		assert len(ds) == 3 and len(set(ds)) == 3
+		assert "P5" not in ds
+		assert set(ds) <= set(pool)
+	assert distractors("P5", ["P5"]) == []
+
+
+def test_adaptive_weights_normalized_with_floor():
+	intervals = ["m2", "M3", "P5", "P8"]
+	state = AdaptiveState(intervals)
+	from eartrainer.models import IntervalStats
+	state.seed_from_stats(Stats(by_interval={n: IntervalStats(seen=20, correct=20) for n in intervals[1:]}))
+	w = state.weights(intervals, min_floor=0.05)
+	assert len(w) == len(intervals)
+	assert abs(float(w.sum()) - 1.0) < 1e-6
+	assert float(w.min()) >= 0.05 * 0.9
+	assert w[0] == w.max()
+	assert len(state.weights([])) == 0
+
+
+def test_choose_interval_follows_cdf():
+	intervals = ["m2", "M3", "P5"]
+	cdf = [0.0, 0.0, 1.0]
+	assert all(choose_interval(intervals, cdf) == "P5" for _ in range(100))
+
+
+def test_seeded_results_are_evicted_oldest_first():
+	from eartrainer.models import IntervalStats
+	state = AdaptiveState(["P4"], window=4)
+	# Seeds the window as [True, True, False] (k=2 of n=3)
+	state.seed_from_stats(Stats(by_interval={"P4": IntervalStats(seen=3, correct=2)}))
+	assert state.accuracy("P4") == 2 / 3
+	state.update("P4", False)  # fills the window: 2/4
+	assert state.accuracy("P4") == 0.5
+	state.update("P4", True)  # evicts a seeded True
+	assert state.accuracy("P4") == 0.5
+	state.update("P4", False)  # evicts the other seeded True
+	assert state.accuracy("P4") == 0.25
+
+
+def test_recent_miss_boost_expires():
+	intervals = ["m2", "M2", "m3", "M3"]
+	state = AdaptiveState(intervals)
+	state.update("m2", False)
+	w = state.weights(intervals)
+	assert w[0] > w[1]
+	# Three later misses push m2 out of the recent-miss window
+	for name in ("M2", "m3", "M3"):
+		state.update(name, False)
+	w = state.weights(intervals)
+	assert w[0] < w[1]
+
+
+def test_adaptive_state_rejects_unknown_intervals():
+	import pytest
+	with pytest.raises(ValueError):
+		AdaptiveState(["m2", "m9"])
+	# The pool can change after construction: every known interval is tracked
+	state = AdaptiveState(["m2"])
+	state.update("P5", False)
+	assert state.accuracy("P5") == 0.0
+	assert len(state.weights(["m2", "P5"])) == 2
+
+
+def test_next_interval_batches_and_follows_pool():
+	state = AdaptiveState(["m2", "P5"])
+	drawn = [state.next_interval(["m2", "P5"]) for _ in range(20)]
+	assert set(drawn) <= {"m2", "P5"}
+	# Changing the pool discards intervals pre-drawn from the old one
+	assert all(state.next_interval(["M3"]) == "M3" for _ in range(5))
+
+
+def test_make_question_never_repeats_last():
+	# P8 can't fit in C3..D3, so roots fall back to the whole (3-note) range;
+	# M2 ascending fits only on C3, forcing an interval redraw after a repeat
+	for intervals in (["P8"], ["M2", "m2"]):
+		settings = Settings(intervals=intervals, range=("C3", "D3"), mode="ascending")
+		state = AdaptiveState(settings.intervals)
+		q = make_question(settings, state)
+		for _ in range(30):
+			nq = make_question(settings, state, q)
+			assert (nq.interval, nq.root_midi) != (q.interval, q.root_midi)
+			q = nq
+
+
+def test_score_answer_counts_confusions():
+	from eartrainer.trainer import score_answer
+	settings = Settings(intervals=["m2", "M2"])
+	state = AdaptiveState(settings.intervals)
+	# Stats loaded from disk carry plain dicts; validation turns them into Counters
+	stats = Stats.model_validate({"confusion": {"m2": {"M2": 2}}})
+	q = make_question(settings, state)
+	wrong = "M2" if q.answer == "m2" else "m2"
+	score_answer(q, wrong, stats, state)
+	score_answer(q, wrong, stats, state)
+	score_answer(q, q.answer, stats, state)
+	assert stats.by_interval[q.interval].seen == 3
+	assert stats.by_interval[q.interval].correct == 1
+	assert stats.confusion[q.interval][wrong] == (4 if q.interval == "m2" else 2)
+
+
+def test_adaptive_weights_uniform_at_cold_start():
+	intervals = ["m2", "M3", "P5"]
+	w = AdaptiveState(intervals).weights(intervals)
+	assert all(abs(float(x) - 1 / 3) < 1e-6 for x in w)
+
+
+def test_miss_redraws_next_interval_with_updated_weights(monkeypatch):
+	import random
+	intervals = ["m2", "M3", "P5"]
+	state = AdaptiveState(intervals)
+	seen_cdfs = []
+	real_choices = random.choices
+
+	def spy(population, weights=None, *, cum_weights=None, k=1):
+		seen_cdfs.append(list(cum_weights))
+		return real_choices(population, cum_weights=cum_weights, k=k)
+
+	monkeypatch.setattr(random, "choices", spy)
+	state.next_interval(intervals)
+	assert len(seen_cdfs) == 1
+	state.update("P5", True)
+	state.next_interval(intervals)
+	# A correct answer keeps the pre-drawn batch
+	assert len(seen_cdfs) == 1
+	state.update("M3", False)
+	state.next_interval(intervals)
+	# The miss forces a fresh draw in which M3 carries more weight
+	assert len(seen_cdfs) == 2
+	before, after = seen_cdfs
+	assert after[1] - after[0] > before[1] - before[0]